@@ -10,11 +10,15 @@ Requested by: Forge
 Date: January 18, 2026
 """
 
+import itertools
 import json
+import secrets
 import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional, Dict, Any, Callable
-from dataclasses import dataclass, asdict
+from typing import List, Optional, Dict, Any, Callable, Iterator
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from enum import Enum
 
@@ -23,6 +27,29 @@ VERSION = "1.0.0"
 # Default database path
 DEFAULT_DB_PATH = Path("D:/BEACON_HQ/TASK_QUEUE/taskqueue.db")
 
+# Current local time as an ISO-8601 string, evaluated inside SQLite so
+# timestamps never need to be formatted in Python and bound per call.
+_SQL_NOW = "strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')"
+
+# Metadata is stored as JSON text unless a database opts in to JSONB
+# (pre-parsed binary JSON, SQLite 3.45+), which json_set() edits without
+# re-parsing. The choice is recorded in PRAGMA user_version so builds
+# that cannot read JSONB refuse the database instead of misreading it.
+_JSONB_SUPPORTED = sqlite3.sqlite_version_info >= (3, 45, 0)
+_FORMAT_JSONB = 1
+
+
+def _jsonb_sql(sql: str) -> str:
+    """Rewrite a statement that reads or writes metadata_json for JSONB storage."""
+    return (sql.replace('completed_at, metadata_json', 'completed_at, json(metadata_json)')
+            .replace(f'{_SQL_NOW}, ?, ?)', f'{_SQL_NOW}, ?, jsonb(?))')
+            .replace('json_set(', 'jsonb_set('))
+
+
+def _new_task_id() -> str:
+    """Generate a random task ID (48 bits, one getrandom call)."""
+    return "task_" + secrets.token_hex(6)
+
 
 class TaskStatus(Enum):
     """Task status."""
@@ -33,6 +60,14 @@ class TaskStatus(Enum):
     CANCELLED = "cancelled"
 
 
+# Plain status strings for the hot paths (skips Enum attribute lookups)
+_PENDING = TaskStatus.PENDING.value
+_IN_PROGRESS = TaskStatus.IN_PROGRESS.value
+_COMPLETED = TaskStatus.COMPLETED.value
+_FAILED = TaskStatus.FAILED.value
+_CANCELLED = TaskStatus.CANCELLED.value
+
+
 class TaskPriority(Enum):
     """Task priority levels."""
     LOW = 1
@@ -41,8 +76,19 @@ class TaskPriority(Enum):
     CRITICAL = 4
 
 
-@dataclass
-class Task:
+# Plain-dict priority lookups (Enum attribute access is comparatively slow)
+_PRIORITY_MAP = {p.name: p.value for p in TaskPriority}
+_PRIORITY_NAME = [""] + [p.name for p in sorted(TaskPriority, key=lambda p: p.value)]
+_DEFAULT_PRIORITY = TaskPriority.NORMAL.value
+
+
+class _LazyMetadata:
+    """Slot holding a Task's raw metadata JSON until it is first read."""
+    __slots__ = ('_metadata_json',)
+
+
+@dataclass(slots=True, init=False)
+class Task(_LazyMetadata):
     """Represents a task."""
     task_id: str
     title: str
@@ -53,10 +99,67 @@ class Task:
     created: str
     scheduled_for: Optional[str]
     completed_at: Optional[str]
-    metadata: Dict[str, Any]
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    
+    def __init__(self,
+                 task_id: str,
+                 title: str,
+                 description: str,
+                 assigned_to: Optional[str],
+                 status: str,
+                 priority: int,
+                 created: str,
+                 scheduled_for: Optional[str],
+                 completed_at: Optional[str],
+                 metadata: Optional[Dict[str, Any]] = None,
+                 *,
+                 _metadata_json: Optional[str] = None):
+        self.task_id = task_id
+        self.title = title
+        self.description = description
+        self.assigned_to = assigned_to
+        self.status = status
+        self.priority = priority
+        self.created = created
+        self.scheduled_for = scheduled_for
+        self.completed_at = completed_at
+        # Rows from the database pass the raw JSON instead; the metadata
+        # slot is left unset and only decoded if it is actually read
+        if metadata is None and _metadata_json:
+            self._metadata_json = _metadata_json
+        else:
+            self.metadata = {} if metadata is None else metadata
+    
+    def __getattr__(self, name):
+        # Only reached while the metadata slot is still unset
+        if name != 'metadata':
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        self.metadata = json.loads(self._metadata_json)
+        return self.metadata
     
     def to_dict(self) -> Dict:
-        return asdict(self)
+        return {
+            "task_id": self.task_id,
+            "title": self.title,
+            "description": self.description,
+            "assigned_to": self.assigned_to,
+            "status": self.status,
+            "priority": self.priority,
+            "created": self.created,
+            "scheduled_for": self.scheduled_for,
+            "completed_at": self.completed_at,
+            "metadata": self.metadata,
+        }
+    
+    @classmethod
+    def from_row(cls, row: tuple) -> "Task":
+        """Build a Task from a row selected with TaskQueuePro._COLUMNS."""
+        return cls(*row[:9], _metadata_json=row[9])
+
+
+def _task_row_factory(cursor: sqlite3.Cursor, row: tuple) -> Task:
+    """sqlite3 row factory that builds Task objects directly."""
+    return Task.from_row(row)
 
 
 class TaskQueuePro:
@@ -80,39 +183,265 @@ class TaskQueuePro:
         queue.complete_task(task_id)
     """
     
-    def __init__(self, db_path: Optional[Path] = None):
-        """Initialize TaskQueuePro."""
+    # Canonical statements. sqlite3 caches prepared statements keyed by SQL
+    # text, so keeping these constant means each is only compiled once.
+    _COLUMNS = ('task_id, title, description, assigned_to, status, priority, '
+                'created, scheduled_for, completed_at, metadata_json')
+    _SQL_INSERT = ('INSERT INTO tasks (task_id, title, description, assigned_to, status, priority, '
+                   'created, scheduled_for, metadata_json) '
+                   f'VALUES (?, ?, ?, ?, ?, ?, {_SQL_NOW}, ?, ?)')
+    _SQL_SELECT_BY_ID = f'SELECT {_COLUMNS} FROM tasks WHERE task_id = ?'
+    
+    # Pending-queue SQL for each (assigned_to, priority_min, limit) filter
+    # combination, keyed by which filters are set. "Now" is evaluated in
+    # SQL, so the text never changes between calls.
+    _SQL_PENDING = {}
+    for _by_agent, _by_priority, _limited in itertools.product((False, True), repeat=3):
+        _SQL_PENDING[_by_agent, _by_priority, _limited] = (
+            f"SELECT {_COLUMNS} FROM tasks WHERE status = '{_PENDING}'"
+            + (' AND assigned_to = ?' if _by_agent else '')
+            + (' AND priority >= ?' if _by_priority else '')
+            + f' AND (scheduled_for IS NULL OR scheduled_for <= {_SQL_NOW})'
+            + ' ORDER BY priority DESC, created ASC, rowid ASC'
+            + (' LIMIT ?' if _limited else '')
+        )
+    del _by_agent, _by_priority, _limited
+    
+    # iter_pending() pages for each (assigned_to, priority_min) combination,
+    # keyed by where the page starts: the head of the queue, later in the
+    # last page's priority (after its created, rowid), or the next lower
+    # priorities. Each resumes with an index seek rather than an OFFSET.
+    _SQL_PENDING_PAGE = {}
+    for _by_agent, _by_priority in itertools.product((False, True), repeat=2):
+        for _after, _condition in ((None, ''),
+                                   ('same', ' AND priority = ? AND (created, rowid) > (?, ?)'),
+                                   ('lower', ' AND priority < ?')):
+            _sql = _SQL_PENDING[_by_agent, _by_priority, True]
+            if _after == 'same':
+                # The page's priority already satisfies priority_min; the
+                # unary + stops the planner seeking on it instead of the
+                # agent index
+                _sql = _sql.replace(' AND priority >= ?', ' AND +priority >= ?')
+            _SQL_PENDING_PAGE[_by_agent, _by_priority, _after] = (
+                _sql.replace(' FROM tasks', ', rowid FROM tasks', 1)
+                .replace(' ORDER BY', f'{_condition} ORDER BY', 1)
+            )
+    del _by_agent, _by_priority, _after, _condition, _sql
+    
+    _SQL_UPDATE_STATUS = 'UPDATE tasks SET status = ? WHERE task_id = ?'
+    _SQL_UPDATE_COMPLETED = f'UPDATE tasks SET status = ?, completed_at = {_SQL_NOW} WHERE task_id = ?'
+    # Metadata keys are written in place with JSON1 rather than read back
+    # into Python, decoded, mutated and re-encoded.
+    _SQL_UPDATE_COMPLETED_RESULT = (f"UPDATE tasks SET status = ?, completed_at = {_SQL_NOW}, "
+                                    f"metadata_json = json_set(COALESCE(metadata_json, '{{}}'), '$.result', json(?)) "
+                                    "WHERE task_id = ?")
+    _SQL_UPDATE_FAILED_ERROR = ("UPDATE tasks SET status = ?, "
+                                f"metadata_json = json_set(COALESCE(metadata_json, '{{}}'), '$.error', ?) "
+                                "WHERE task_id = ?")
+    
+    # Atomic claim: pick and mark the next task in one statement so two
+    # workers can never both receive the same task. The subquery walks
+    # idx_pending_order from the top, so no sort of the pending set; it is
+    # forced because the planner otherwise prefers an OR over
+    # idx_assigned_to followed by a full sort.
+    _SQL_CLAIM_NEXT = ("UPDATE tasks SET status = ?, assigned_to = COALESCE(assigned_to, ?) "
+                       "WHERE task_id = ("
+                       f"SELECT task_id FROM tasks INDEXED BY idx_pending_order WHERE status = '{_PENDING}' "
+                       "AND (assigned_to IS NULL OR assigned_to = ?) "
+                       f"AND (scheduled_for IS NULL OR scheduled_for <= {_SQL_NOW}) "
+                       "ORDER BY priority DESC, created ASC, rowid ASC LIMIT 1"
+                       f") RETURNING {_COLUMNS}")
+    
+    # Statistics cover both live and archived tasks
+    _SQL_STATS = ("SELECT 'status', status, COUNT(*) FROM tasks GROUP BY status "
+                  "UNION ALL "
+                  "SELECT 'status', status, COUNT(*) FROM tasks_archive GROUP BY status "
+                  "UNION ALL "
+                  "SELECT 'agent', assigned_to, COUNT(*) FROM tasks WHERE assigned_to IS NOT NULL GROUP BY assigned_to "
+                  "UNION ALL "
+                  "SELECT 'agent', assigned_to, COUNT(*) FROM tasks_archive WHERE assigned_to IS NOT NULL GROUP BY assigned_to "
+                  "UNION ALL "
+                  "SELECT 'total', NULL, (SELECT COUNT(*) FROM tasks) + (SELECT COUNT(*) FROM tasks_archive)")
+    
+    _SQL_SELECT_ARCHIVED_BY_ID = f'SELECT {_COLUMNS} FROM tasks_archive WHERE task_id = ?'
+    _SQL_ARCHIVE_COPY = (f"INSERT INTO tasks_archive SELECT * FROM tasks "
+                         f"WHERE status = '{_COMPLETED}' AND completed_at < ?")
+    _SQL_ARCHIVE_DELETE = f"DELETE FROM tasks WHERE status = '{_COMPLETED}' AND completed_at < ?"
+    
+    # JSONB versions of every statement touching metadata_json, set on
+    # the instance when the database stores JSONB (see _init_format())
+    _SQL_JSONB = {
+        '_SQL_INSERT': _jsonb_sql(_SQL_INSERT),
+        '_SQL_SELECT_BY_ID': _jsonb_sql(_SQL_SELECT_BY_ID),
+        '_SQL_PENDING': {key: _jsonb_sql(sql) for key, sql in _SQL_PENDING.items()},
+        '_SQL_PENDING_PAGE': {key: _jsonb_sql(sql) for key, sql in _SQL_PENDING_PAGE.items()},
+        '_SQL_UPDATE_COMPLETED_RESULT': _jsonb_sql(_SQL_UPDATE_COMPLETED_RESULT),
+        '_SQL_UPDATE_FAILED_ERROR': _jsonb_sql(_SQL_UPDATE_FAILED_ERROR),
+        '_SQL_CLAIM_NEXT': _jsonb_sql(_SQL_CLAIM_NEXT),
+        '_SQL_SELECT_ARCHIVED_BY_ID': _jsonb_sql(_SQL_SELECT_ARCHIVED_BY_ID),
+    }
+    
+    # Rows per executemany() call in add_tasks()
+    _BULK_CHUNK = 500
+    
+    # Largest page fetched by iter_pending(); pages start at one row and
+    # double, so stopping after the first few tasks stays cheap
+    _FETCH_BATCH = 256
+    
+    def __init__(self, db_path: Optional[Path] = None, jsonb: bool = False):
+        """
+        Initialize TaskQueuePro.
+        
+        Args:
+            db_path: Database file (default DEFAULT_DB_PATH)
+            jsonb: Store metadata as JSONB (SQLite 3.45+). Converts an
+                existing text database; every process sharing it then
+                needs SQLite 3.45+ as well.
+        
+        Raises:
+            sqlite3.NotSupportedError: If JSONB is requested or already
+                used by the database but this SQLite build predates 3.45
+        """
         self.db_path = db_path or DEFAULT_DB_PATH
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Re-entrant so methods can be called inside transaction()
+        self._lock = threading.RLock()
+        self._ro_lock = threading.Lock()
         self._init_database()
+        try:
+            self._init_format(jsonb)
+        except BaseException:
+            self._conn.close()
+            raise
+        self._init_reader()
     
     def _init_database(self):
-        """Initialize task database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Open the shared write connection and initialize task database."""
+        # One long-lived connection: avoids re-parsing the schema and
+        # starting with a cold page cache on every operation.
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None,
+                                     cached_statements=256)
+        cursor = self._conn.cursor()
+        
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.execute('PRAGMA cache_size=-64000')
+        
+        # Live tasks, plus an identical table that old completed tasks are
+        # moved to by archive_completed()
+        for table in ('tasks', 'tasks_archive'):
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    task_id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    description TEXT,
+                    assigned_to TEXT,
+                    status TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    created TEXT NOT NULL,
+                    scheduled_for TEXT,
+                    completed_at TEXT,
+                    metadata_json TEXT
+                )
+            ''')
+        
+        # Full-table indexes from earlier versions. Finished tasks made them
+        # grow without bound; the pending queries they served now use the
+        # partial indexes below.
+        for index in ('idx_status', 'idx_priority', 'idx_scheduled', 'idx_assigned_to'):
+            cursor.execute(f'DROP INDEX IF EXISTS {index}')
+        
+        # Partial index holding only the pending queue, in get_pending()'s
+        # ORDER BY, so dispatch reads stay within a small, cache-resident
+        # B-tree and need no temp sort. created only has millisecond
+        # precision, so ties fall back to the implicit trailing rowid,
+        # which keeps same-millisecond tasks in insertion (FIFO) order.
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pending_order '
+                       'ON tasks(priority DESC, created ASC) '
+                       f"WHERE status = '{_PENDING}'")
+        # The same queue per agent, for get_pending(assigned_to=...)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pending_agent '
+                       'ON tasks(assigned_to, priority DESC, created ASC) '
+                       f"WHERE status = '{_PENDING}'")
+    
+    def _init_format(self, jsonb: bool):
+        """Pick the metadata storage format, converting to JSONB if requested."""
+        with self.transaction():
+            stored = self._conn.execute('PRAGMA user_version').fetchone()[0]
+            if stored != _FORMAT_JSONB and not jsonb:
+                return
+            
+            if not _JSONB_SUPPORTED:
+                reason = (f"{self.db_path} stores metadata as JSONB" if stored == _FORMAT_JSONB
+                          else "JSONB metadata was requested")
+                raise sqlite3.NotSupportedError(
+                    f"{reason}, which needs SQLite 3.45+ (this is {sqlite3.sqlite_version})")
+            
+            if stored != _FORMAT_JSONB:
+                for table in ('tasks', 'tasks_archive'):
+                    self._conn.execute(f'UPDATE {table} SET metadata_json = jsonb(metadata_json) '
+                                       'WHERE metadata_json IS NOT NULL')
+                self._conn.execute(f'PRAGMA user_version = {_FORMAT_JSONB}')
         
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                task_id TEXT PRIMARY KEY,
-                title TEXT NOT NULL,
-                description TEXT,
-                assigned_to TEXT,
-                status TEXT NOT NULL,
-                priority INTEGER NOT NULL,
-                created TEXT NOT NULL,
-                scheduled_for TEXT,
-                completed_at TEXT,
-                metadata_json TEXT
-            )
-        ''')
+        vars(self).update(self._SQL_JSONB)
+    
+    def _init_reader(self):
+        """Open the read-only connection used by queries."""
+        # Reads get their own connection (and page cache) so they never
+        # queue behind the writer's lock; WAL lets them run concurrently.
+        self._conn_ro = self._connect_reader()
+    
+    def _connect_reader(self) -> sqlite3.Connection:
+        """Open a new read-only connection to the database."""
+        uri = self.db_path.resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None,
+                               cached_statements=256)
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-64000')
+        return conn
+    
+    def _reader(self):
+        """Return the (connection, lock) pair a read query should use."""
+        # Inside an open write transaction, read through the writer so
+        # its uncommitted changes are visible.
+        if self._conn.in_transaction:
+            return self._conn, self._lock
+        return self._conn_ro, self._ro_lock
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Group several operations into one write transaction.
         
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_status ON tasks(status)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_assigned_to ON tasks(assigned_to)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_priority ON tasks(priority)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_scheduled ON tasks(scheduled_for)')
+        Usage:
+            with queue.transaction():
+                queue.add_task("Step 1")
+                queue.complete_task(previous_id)
         
-        conn.commit()
-        conn.close()
+        Commits when the block exits and rolls back if it raises. The
+        write lock is taken up front (BEGIN IMMEDIATE), and nested calls
+        join the outer transaction.
+        """
+        with self._lock:
+            if self._conn.in_transaction:
+                yield
+                return
+            
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+    
+    def close(self):
+        """Close the database connections."""
+        with self._ro_lock:
+            self._conn_ro.close()
+        with self._lock:
+            self._conn.close()
     
     def add_task(self,
                  title: str,
@@ -134,208 +463,253 @@ class TaskQueuePro:
         
         Returns:
             Task ID
+        
+        Raises:
+            ValueError: If metadata contains NaN or Infinity
         """
-        # Generate task ID
-        import hashlib
-        task_id = "task_" + hashlib.md5(f"{title}{datetime.now().isoformat()}".encode()).hexdigest()[:8]
+        row = self._build_row(title, description, assigned_to, priority, schedule_at, metadata)
         
-        # Convert priority
-        priority_val = getattr(TaskPriority, priority.upper(), TaskPriority.NORMAL).value
+        # Insert task
+        with self._lock:
+            self._conn.execute(self._SQL_INSERT, row)
         
-        # Prepare data
-        created = datetime.now().isoformat()
-        scheduled_for = schedule_at.isoformat() if schedule_at else None
-        metadata_json = json.dumps(metadata) if metadata else None
+        return row[0]
+    
+    def add_tasks(self, specs: List[Dict[str, Any]]) -> List[str]:
+        """
+        Add many tasks in a single transaction.
         
-        # Insert task
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        Args:
+            specs: One dict per task, using the same keys as add_task()
+        
+        Returns:
+            Task IDs, in the same order as specs
+        """
+        rows = [self._build_row(**spec) for spec in specs]
+        
+        with self.transaction():
+            for start in range(0, len(rows), self._BULK_CHUNK):
+                self._conn.executemany(self._SQL_INSERT, rows[start:start + self._BULK_CHUNK])
         
-        cursor.execute('''
-            INSERT INTO tasks (task_id, title, description, assigned_to, status, priority, created, scheduled_for, metadata_json)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (task_id, title, description, assigned_to, TaskStatus.PENDING.value, priority_val, created, scheduled_for, metadata_json))
+        return [row[0] for row in rows]
+    
+    def _build_row(self,
+                   title: str,
+                   description: str = "",
+                   assigned_to: Optional[str] = None,
+                   priority: str = "NORMAL",
+                   schedule_at: Optional[datetime] = None,
+                   metadata: Optional[Dict] = None) -> tuple:
+        """Build the INSERT parameters for a new task."""
+        # Generate task ID
+        task_id = _new_task_id()
         
-        conn.commit()
-        conn.close()
+        # Convert priority
+        priority_val = _PRIORITY_MAP.get(priority.upper(), _DEFAULT_PRIORITY)
         
-        return task_id
+        # Prepare data (strict JSON: SQLite's JSON functions reject NaN/Infinity)
+        scheduled_for = schedule_at.isoformat() if schedule_at else None
+        metadata_json = json.dumps(metadata, allow_nan=False) if metadata else None
+        
+        return (task_id, title, description, assigned_to, _PENDING,
+                priority_val, scheduled_for, metadata_json)
     
     def get_pending(self,
                     assigned_to: Optional[str] = None,
-                    priority_min: Optional[str] = None) -> List[Task]:
+                    priority_min: Optional[str] = None,
+                    limit: Optional[int] = None) -> List[Task]:
         """
         Get pending tasks.
         
         Args:
             assigned_to: Filter by assigned agent
             priority_min: Minimum priority level
+            limit: Maximum number of tasks to return (None = all)
         
         Returns:
             List of Task objects
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        sql, params = self._pending_query(assigned_to, priority_min, limit)
         
-        sql = 'SELECT task_id, title, description, assigned_to, status, priority, created, scheduled_for, completed_at, metadata_json FROM tasks WHERE status = ?'
-        params = [TaskStatus.PENDING.value]
+        conn, lock = self._reader()
+        with lock:
+            return self._query_tasks(conn, sql, params).fetchall()
+    
+    def iter_pending(self,
+                     assigned_to: Optional[str] = None,
+                     priority_min: Optional[str] = None,
+                     limit: Optional[int] = None) -> Iterator[Task]:
+        """
+        Iterate over pending tasks in dispatch order.
+        
+        Same filters as get_pending(), but rows are fetched in batches
+        and converted lazily, so callers that stop early never build
+        Task objects for the rest of the queue.
+        
+        Pages are read with keyset pagination (resuming after the last
+        row's priority, created and rowid), each fetched in full under the
+        reader's lock, so no statement or snapshot stays open between
+        yields and a partly consumed iterator never blocks other readers
+        or writers. Changes committed while iterating are picked up by
+        later pages.
+        """
+        params = self._pending_params(assigned_to, priority_min)
+        filters = bool(assigned_to), bool(priority_min)
+        remaining = limit
+        after = None
+        page = 1
+        
+        while remaining is None or remaining > 0:
+            batch = page if remaining is None else min(page, remaining)
+            
+            # Read through the writer inside a transaction (see _reader())
+            conn, lock = self._reader()
+            with lock:
+                if after is None:
+                    rows = conn.execute(self._SQL_PENDING_PAGE[filters + (None,)],
+                                        params + [batch]).fetchall()
+                else:
+                    rows = conn.execute(self._SQL_PENDING_PAGE[filters + ('same',)],
+                                        params + list(after) + [batch]).fetchall()
+                    if not rows:
+                        rows = conn.execute(self._SQL_PENDING_PAGE[filters + ('lower',)],
+                                            params + [after[0], batch]).fetchall()
+            if not rows:
+                return
+            
+            for row in rows:
+                yield Task.from_row(row)
+            
+            last = rows[-1]
+            after = (last[5], last[6], last[10])
+            page = min(page * 2, self._FETCH_BATCH)
+            if remaining is not None:
+                remaining -= len(rows)
+    
+    def _pending_params(self, assigned_to: Optional[str], priority_min: Optional[str]) -> list:
+        """Bind parameters for the assigned_to/priority_min pending filters."""
+        params = []
         
         if assigned_to:
-            sql += ' AND assigned_to = ?'
             params.append(assigned_to)
         
         if priority_min:
-            min_val = getattr(TaskPriority, priority_min.upper(), TaskPriority.NORMAL).value
-            sql += ' AND priority >= ?'
-            params.append(min_val)
-        
-        # Only show tasks that are scheduled for now or past
-        sql += ' AND (scheduled_for IS NULL OR scheduled_for <= ?)'
-        params.append(datetime.now().isoformat())
-        
-        sql += ' ORDER BY priority DESC, created ASC'
-        
-        cursor.execute(sql, params)
-        rows = cursor.fetchall()
-        conn.close()
-        
-        tasks = []
-        for row in rows:
-            task_id, title, desc, assigned, status, priority, created, scheduled, completed, meta_json = row
-            tasks.append(Task(
-                task_id=task_id,
-                title=title,
-                description=desc,
-                assigned_to=assigned,
-                status=status,
-                priority=priority,
-                created=created,
-                scheduled_for=scheduled,
-                completed_at=completed,
-                metadata=json.loads(meta_json) if meta_json else {}
-            ))
-        
-        return tasks
+            params.append(_PRIORITY_MAP.get(priority_min.upper(), _DEFAULT_PRIORITY))
+        
+        return params
+    
+    def _pending_query(self,
+                       assigned_to: Optional[str],
+                       priority_min: Optional[str],
+                       limit: Optional[int]) -> tuple:
+        """Pick the pending-queue SQL and bind parameters for the given filters."""
+        params = self._pending_params(assigned_to, priority_min)
+        
+        if limit is not None:
+            params.append(limit)
+        
+        sql = self._SQL_PENDING[bool(assigned_to), bool(priority_min), limit is not None]
+        return sql, params
     
     def get_task(self, task_id: str) -> Optional[Task]:
-        """Get specific task by ID."""
-        conn = sqlite3.connect(self.db_path)
+        """Get specific task by ID (including archived tasks)."""
+        conn, lock = self._reader()
+        with lock:
+            task = self._query_tasks(conn, self._SQL_SELECT_BY_ID, (task_id,)).fetchone()
+            if task is None:
+                task = self._query_tasks(conn, self._SQL_SELECT_ARCHIVED_BY_ID, (task_id,)).fetchone()
+            return task
+    
+    def _query_tasks(self, conn: sqlite3.Connection, sql: str, params) -> sqlite3.Cursor:
+        """Execute a query selecting _COLUMNS; rows come back as Task objects."""
         cursor = conn.cursor()
+        cursor.row_factory = _task_row_factory
+        return cursor.execute(sql, params)
+    
+    def claim_next(self, assigned_to: str) -> Optional[Task]:
+        """
+        Claim the next ready task for an agent.
         
-        cursor.execute('''
-            SELECT task_id, title, description, assigned_to, status, priority, created, scheduled_for, completed_at, metadata_json
-            FROM tasks WHERE task_id = ?
-        ''', (task_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            task_id, title, desc, assigned, status, priority, created, scheduled, completed, meta_json = row
-            return Task(
-                task_id=task_id,
-                title=title,
-                description=desc,
-                assigned_to=assigned,
-                status=status,
-                priority=priority,
-                created=created,
-                scheduled_for=scheduled,
-                completed_at=completed,
-                metadata=json.loads(meta_json) if meta_json else {}
-            )
-        return None
+        Picks the highest-priority pending task that is assigned to the
+        agent or unassigned, marks it in progress and assigns it to the
+        agent, all in a single UPDATE.
+        
+        Args:
+            assigned_to: Agent claiming the task
+        
+        Returns:
+            The claimed Task, or None if nothing is ready
+        """
+        with self._lock:
+            tasks = self._query_tasks(self._conn, self._SQL_CLAIM_NEXT, (
+                _IN_PROGRESS, assigned_to, assigned_to
+            )).fetchall()
+        
+        return tasks[0] if tasks else None
     
     def start_task(self, task_id: str) -> bool:
         """Mark task as in progress."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE tasks SET status = ? WHERE task_id = ?
-        ''', (TaskStatus.IN_PROGRESS.value, task_id))
-        
-        conn.commit()
-        success = cursor.rowcount > 0
-        conn.close()
-        return success
+        with self._lock:
+            cursor = self._conn.execute(self._SQL_UPDATE_STATUS, (_IN_PROGRESS, task_id))
+            return cursor.rowcount > 0
     
     def complete_task(self, task_id: str, result: Optional[Dict] = None) -> bool:
-        """Mark task as completed."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        """Mark task as completed (raises ValueError if result contains NaN or Infinity)."""
         # Update metadata with result if provided
         if result:
-            cursor.execute('SELECT metadata_json FROM tasks WHERE task_id = ?', (task_id,))
-            row = cursor.fetchone()
-            if row:
-                metadata = json.loads(row[0]) if row[0] else {}
-                metadata['result'] = result
-                metadata_json = json.dumps(metadata)
-                
-                cursor.execute('''
-                    UPDATE tasks SET status = ?, completed_at = ?, metadata_json = ?
-                    WHERE task_id = ?
-                ''', (TaskStatus.COMPLETED.value, datetime.now().isoformat(), metadata_json, task_id))
-            else:
-                return False
+            sql = self._SQL_UPDATE_COMPLETED_RESULT
+            params = (_COMPLETED, json.dumps(result, allow_nan=False), task_id)
         else:
-            cursor.execute('''
-                UPDATE tasks SET status = ?, completed_at = ? WHERE task_id = ?
-            ''', (TaskStatus.COMPLETED.value, datetime.now().isoformat(), task_id))
+            sql = self._SQL_UPDATE_COMPLETED
+            params = (_COMPLETED, task_id)
         
-        conn.commit()
-        success = cursor.rowcount > 0
-        conn.close()
-        return success
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount > 0
     
     def fail_task(self, task_id: str, error: str) -> bool:
         """Mark task as failed."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         # Add error to metadata
-        cursor.execute('SELECT metadata_json FROM tasks WHERE task_id = ?', (task_id,))
-        row = cursor.fetchone()
-        if row:
-            metadata = json.loads(row[0]) if row[0] else {}
-            metadata['error'] = error
-            metadata_json = json.dumps(metadata)
-            
-            cursor.execute('''
-                UPDATE tasks SET status = ?, metadata_json = ? WHERE task_id = ?
-            ''', (TaskStatus.FAILED.value, metadata_json, task_id))
-            
-            conn.commit()
-            success = cursor.rowcount > 0
-            conn.close()
-            return success
-        
-        conn.close()
-        return False
+        with self._lock:
+            cursor = self._conn.execute(self._SQL_UPDATE_FAILED_ERROR, (_FAILED, error, task_id))
+            return cursor.rowcount > 0
     
     def get_stats(self) -> Dict[str, Any]:
         """Get task queue statistics."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT status, COUNT(*) FROM tasks GROUP BY status')
-        by_status = dict(cursor.fetchall())
-        
-        cursor.execute('SELECT assigned_to, COUNT(*) FROM tasks WHERE assigned_to IS NOT NULL GROUP BY assigned_to')
-        by_agent = dict(cursor.fetchall())
-        
-        cursor.execute('SELECT COUNT(*) FROM tasks')
-        total = cursor.fetchone()[0]
-        
-        conn.close()
+        conn, lock = self._reader()
+        with lock:
+            rows = conn.execute(self._SQL_STATS).fetchall()
+        
+        buckets = {'status': {}, 'agent': {}, 'total': {}}
+        for kind, key, count in rows:
+            bucket = buckets[kind]
+            bucket[key] = bucket.get(key, 0) + count
+        by_status = buckets['status']
+        by_agent = buckets['agent']
+        total = buckets['total'][None]
         
         return {
             "total_tasks": total,
             "by_status": by_status,
             "by_agent": by_agent
         }
+    
+    def archive_completed(self, older_than: timedelta = timedelta(days=30)) -> int:
+        """
+        Move old completed tasks into the archive table.
+        
+        Keeps the live table and its indexes small. Archived tasks are
+        still returned by get_task() and counted by get_stats().
+        
+        Args:
+            older_than: Archive tasks completed longer ago than this
+        
+        Returns:
+            Number of tasks archived
+        """
+        cutoff = (datetime.now() - older_than).isoformat()
+        with self.transaction():
+            self._conn.execute(self._SQL_ARCHIVE_COPY, (cutoff,))
+            return self._conn.execute(self._SQL_ARCHIVE_DELETE, (cutoff,)).rowcount
 
 
 def main():
@@ -344,13 +718,14 @@ def main():
     
     parser = argparse.ArgumentParser(description="TaskQueuePro - Self-scheduling task management")
     
-    parser.add_argument('command', choices=['add', 'list', 'start', 'complete', 'stats'],
+    parser.add_argument('command', choices=['add', 'list', 'start', 'complete', 'stats', 'archive'],
                         help='Command to execute')
     parser.add_argument('--title', help='Task title')
     parser.add_argument('--desc', help='Task description')
     parser.add_argument('--assign', help='Assign to agent')
     parser.add_argument('--priority', choices=['LOW', 'NORMAL', 'HIGH', 'CRITICAL'], default='NORMAL')
     parser.add_argument('--id', dest='task_id', help='Task ID')
+    parser.add_argument('--days', type=int, default=30, help='Archive tasks completed more than this many days ago')
     parser.add_argument('--version', action='version', version=f'TaskQueuePro {VERSION}')
     
     args = parser.parse_args()
@@ -374,7 +749,7 @@ def main():
         tasks = queue.get_pending(assigned_to=args.assign)
         print(f"\n📋 PENDING TASKS ({len(tasks)}):\n")
         for task in tasks:
-            priority_name = TaskPriority(task.priority).name
+            priority_name = _PRIORITY_NAME[task.priority]
             print(f"  [{priority_name}] {task.title}")
             if task.assigned_to:
                 print(f"      Assigned to: {task.assigned_to}")
@@ -401,6 +776,10 @@ def main():
         print(f"\nBy status: {stats['by_status']}")
         print(f"By agent: {stats['by_agent']}\n")
     
+    elif args.command == 'archive':
+        archived = queue.archive_completed(timedelta(days=args.days))
+        print(f"[OK] Archived {archived} completed task(s)")
+    
     return 0
 
 
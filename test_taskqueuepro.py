@@ -8,12 +8,17 @@ Author: Atlas (Team Brain)
 Date: January 18, 2026
 """
 
+import dataclasses
 import unittest
 import tempfile
+import threading
 import shutil
+import sqlite3
+from unittest import mock
 from pathlib import Path
 from datetime import datetime, timedelta
-from taskqueuepro import TaskQueuePro, TaskStatus, TaskPriority
+import taskqueuepro
+from taskqueuepro import TaskQueuePro, Task, TaskStatus, TaskPriority
 
 
 class TestTaskQueuePro(unittest.TestCase):
@@ -27,6 +32,7 @@ class TestTaskQueuePro(unittest.TestCase):
     
     def tearDown(self):
         """Clean up test environment."""
+        self.queue.close()
         # Remove temporary database
         if self.test_db.parent.exists():
             shutil.rmtree(self.test_db.parent, ignore_errors=True)
@@ -219,6 +225,7 @@ class TestTaskQueuePro(unittest.TestCase):
         
         task = self.queue.get_task(task_id)
         self.assertEqual(task.status, TaskStatus.COMPLETED.value)
+        self.assertEqual(task.metadata["result"], result_data)
     
     def test_14_get_task_not_found(self):
         """Test getting non-existent task."""
@@ -236,7 +243,346 @@ class TestTaskQueuePro(unittest.TestCase):
         
         self.assertEqual(len(atlas_tasks), 2)
         self.assertEqual(len(bolt_tasks), 1)
+    
+    def test_16_add_tasks_bulk(self):
+        """Test adding many tasks in one call."""
+        specs = [{"title": f"Bulk {i}", "assigned_to": "ATLAS"} for i in range(1200)]
+        specs.append({"title": "Bulk critical", "priority": "CRITICAL", "metadata": {"batch": True}})
+        
+        task_ids = self.queue.add_tasks(specs)
+        
+        self.assertEqual(len(task_ids), 1201)
+        self.assertEqual(self.queue.get_stats()["total_tasks"], 1201)
+        
+        task = self.queue.get_task(task_ids[-1])
+        self.assertEqual(task.title, "Bulk critical")
+        self.assertEqual(task.priority, TaskPriority.CRITICAL.value)
+        self.assertTrue(task.metadata["batch"])
+    
+    def test_17_result_and_error_keep_metadata(self):
+        """Test that result/error are merged into existing metadata."""
+        done_id = self.queue.add_task(title="Done", metadata={"project": "Q-Mode"})
+        failed_id = self.queue.add_task(title="Failed", metadata={"project": "Q-Mode"})
+        
+        self.assertTrue(self.queue.complete_task(done_id, result={"output": None, "count": 3}))
+        self.assertTrue(self.queue.fail_task(failed_id, error="Boom"))
+        self.assertFalse(self.queue.complete_task("nonexistent_id", result={"x": 1}))
+        self.assertFalse(self.queue.fail_task("nonexistent_id", error="Boom"))
+        
+        done = self.queue.get_task(done_id)
+        self.assertEqual(done.metadata, {"project": "Q-Mode", "result": {"output": None, "count": 3}})
+        failed = self.queue.get_task(failed_id)
+        self.assertEqual(failed.metadata, {"project": "Q-Mode", "error": "Boom"})
+    
+    def test_18_pending_limit_and_iteration(self):
+        """Test limiting and lazily iterating pending tasks."""
+        self.queue.add_tasks([{"title": f"Task {i}"} for i in range(600)])
+        self.queue.add_task(title="Urgent", priority="CRITICAL")
+        
+        top = self.queue.get_pending(limit=1)
+        self.assertEqual(len(top), 1)
+        self.assertEqual(top[0].title, "Urgent")
+        
+        pending = self.queue.iter_pending()
+        self.assertEqual(next(pending).title, "Urgent")
+        self.assertEqual(sum(1 for _ in pending), 600)
+    
+    def test_19_task_to_dict(self):
+        """Test serializing a task to a plain dict."""
+        task_id = self.queue.add_task(title="Export me", assigned_to="ATLAS", metadata={"k": "v"})
+        
+        data = self.queue.get_task(task_id).to_dict()
+        self.assertEqual(data["task_id"], task_id)
+        self.assertEqual(data["title"], "Export me")
+        self.assertEqual(data["assigned_to"], "ATLAS")
+        self.assertEqual(data["status"], TaskStatus.PENDING.value)
+        self.assertEqual(data["metadata"], {"k": "v"})
+        self.assertEqual(len(data), 10)
+    
+    def test_20_metadata_decoded_lazily(self):
+        """Test that metadata is only decoded when accessed."""
+        self.queue.add_task(title="Lazy", metadata={"tags": ["a", "b"]})
+        
+        task = self.queue.get_pending()[0]
+        with self.assertRaises(AttributeError):
+            object.__getattribute__(task, "metadata")
+        self.assertEqual(task.metadata["tags"], ["a", "b"])
+        self.assertIs(task.metadata, object.__getattribute__(task, "metadata"))
+    
+    def test_21_claim_next(self):
+        """Test atomically claiming the next ready task."""
+        self.queue.add_task(title="Bolt Task", priority="CRITICAL", assigned_to="BOLT")
+        self.queue.add_task(title="Future Task", priority="CRITICAL",
+                            schedule_at=datetime.now() + timedelta(hours=2))
+        self.queue.add_task(title="Open Task", priority="LOW")
+        self.queue.add_task(title="Atlas Task", priority="HIGH", assigned_to="ATLAS")
+        
+        task = self.queue.claim_next("ATLAS")
+        self.assertEqual(task.title, "Atlas Task")
+        self.assertEqual(task.status, TaskStatus.IN_PROGRESS.value)
+        
+        task = self.queue.claim_next("ATLAS")
+        self.assertEqual(task.title, "Open Task")
+        self.assertEqual(task.assigned_to, "ATLAS")
+        self.assertEqual(self.queue.get_task(task.task_id).status, TaskStatus.IN_PROGRESS.value)
+        
+        self.assertIsNone(self.queue.claim_next("ATLAS"))
+    
+    def test_22_pending_filter_combinations(self):
+        """Test get_pending with every filter combination."""
+        self.queue.add_task(title="Atlas High", priority="HIGH", assigned_to="ATLAS")
+        self.queue.add_task(title="Atlas Low", priority="LOW", assigned_to="ATLAS")
+        self.queue.add_task(title="Bolt High", priority="HIGH", assigned_to="BOLT")
+        self.queue.add_task(title="Atlas Later", priority="CRITICAL", assigned_to="ATLAS",
+                            schedule_at=datetime.now() + timedelta(hours=2))
+        
+        titles = lambda tasks: [t.title for t in tasks]
+        self.assertEqual(titles(self.queue.get_pending()), ["Atlas High", "Bolt High", "Atlas Low"])
+        self.assertEqual(titles(self.queue.get_pending(limit=2)), ["Atlas High", "Bolt High"])
+        self.assertEqual(titles(self.queue.get_pending(priority_min="HIGH")), ["Atlas High", "Bolt High"])
+        self.assertEqual(titles(self.queue.get_pending(assigned_to="ATLAS", priority_min="HIGH")), ["Atlas High"])
+        self.assertEqual(titles(self.queue.get_pending(assigned_to="ATLAS", priority_min="LOW", limit=1)),
+                         ["Atlas High"])
 
+    
+    def test_23_reads_use_read_only_connection(self):
+        """Test that queries go through a connection that cannot write."""
+        task_id = self.queue.add_task(title="Visible", assigned_to="ATLAS")
+        
+        self.assertEqual(self.queue.get_task(task_id).title, "Visible")
+        self.assertEqual(len(self.queue.get_pending()), 1)
+        with self.assertRaises(sqlite3.OperationalError):
+            self.queue._conn_ro.execute("DELETE FROM tasks")
+    
+    def test_24_claim_next_sees_outside_changes(self):
+        """Test that claim_next tracks tasks added or started elsewhere."""
+        first_id = self.queue.add_task(title="First", priority="HIGH")
+        self.queue.add_task(title="Second")
+        self.assertEqual(self.queue.claim_next("ATLAS").task_id, first_id)
+        
+        # Another instance adds a more urgent task and starts the queued one
+        other = TaskQueuePro(db_path=self.test_db)
+        other.add_task(title="Urgent", priority="CRITICAL")
+        self.assertEqual(self.queue.claim_next("ATLAS").title, "Urgent")
+        
+        started_id = self.queue.get_pending()[0].task_id
+        other.start_task(started_id)
+        other.close()
+        self.assertIsNone(self.queue.claim_next("ATLAS"))
+    
+    def test_25_transaction(self):
+        """Test grouping operations in a transaction."""
+        with self.queue.transaction():
+            task_id = self.queue.add_task(title="In transaction")
+            self.queue.add_tasks([{"title": "Bulk in transaction"}])
+            self.assertEqual(self.queue.get_task(task_id).title, "In transaction")
+        self.assertEqual(self.queue.get_stats()["total_tasks"], 2)
+        
+        with self.assertRaises(RuntimeError):
+            with self.queue.transaction():
+                self.queue.add_task(title="Rolled back")
+                self.assertIsNotNone(self.queue.claim_next("ATLAS"))
+                raise RuntimeError("abort")
+        
+        self.assertEqual(self.queue.get_stats()["total_tasks"], 2)
+        self.assertEqual(len(self.queue.get_pending()), 2)
+        self.assertIsNotNone(self.queue.claim_next("ATLAS"))
+    
+    def test_26_archive_completed(self):
+        """Test moving old completed tasks to the archive."""
+        done_id = self.queue.add_task(title="Done", assigned_to="ATLAS")
+        self.queue.add_task(title="Still pending", assigned_to="ATLAS")
+        self.queue.complete_task(done_id, result={"ok": True})
+        
+        # Nothing is old enough yet
+        self.assertEqual(self.queue.archive_completed(timedelta(days=1)), 0)
+        self.assertEqual(self.queue.archive_completed(timedelta(0)), 1)
+        
+        # Archived tasks are still found and counted
+        task = self.queue.get_task(done_id)
+        self.assertEqual(task.status, TaskStatus.COMPLETED.value)
+        self.assertEqual(task.metadata["result"], {"ok": True})
+        
+        stats = self.queue.get_stats()
+        self.assertEqual(stats["total_tasks"], 2)
+        self.assertEqual(stats["by_status"], {"pending": 1, "completed": 1})
+        self.assertEqual(stats["by_agent"], {"ATLAS": 2})
+        self.assertEqual(len(self.queue.get_pending()), 1)
+    
+    def test_27_fifo_within_priority(self):
+        """Test that same-priority tasks keep insertion order."""
+        ids = [self.queue.add_task(title=f"t{i}") for i in range(5)]
+        ids += self.queue.add_tasks([{"title": f"b{i}"} for i in range(5)])
+        
+        self.assertEqual([t.task_id for t in self.queue.get_pending()], ids)
+        self.assertEqual(self.queue.get_pending(limit=1)[0].task_id, ids[0])
+        self.assertEqual(self.queue.claim_next("ATLAS").task_id, ids[0])
+        self.assertEqual(self.queue.get_pending()[0].task_id, ids[1])
+    
+    def test_28_partial_iteration_does_not_pin_reads(self):
+        """Test that an unfinished iter_pending() doesn't hide later writes."""
+        self.queue.add_tasks([{"title": f"Task {i}"} for i in range(TaskQueuePro._FETCH_BATCH * 2 + 89)])
+        
+        pending = self.queue.iter_pending()
+        task = next(pending)
+        self.queue.complete_task(task.task_id)
+        new_id = self.queue.add_task(title="New")
+        
+        self.assertEqual(self.queue.get_task(task.task_id).status, TaskStatus.COMPLETED.value)
+        self.assertEqual(self.queue.get_task(new_id).title, "New")
+        self.assertEqual(self.queue.get_stats()["by_status"]["completed"], 1)
+        pending.close()
+    
+    def test_29_task_metadata_api(self):
+        """Test constructing, assigning and comparing Task metadata."""
+        fields = ("task_x", "Title", "", None, "pending", 2, "2026-01-18T09:00:00", None, None)
+        task = Task(*fields, metadata={"a": 1, "b": 2})
+        self.assertEqual(task.metadata, {"a": 1, "b": 2})
+        self.assertEqual(Task(*fields).metadata, {})
+        
+        # Equality compares decoded metadata, not JSON text
+        stored = Task(*fields, _metadata_json='{"b": 2, "a": 1}')
+        self.assertEqual(task, stored)
+        
+        task.metadata = {"c": 3}
+        self.assertEqual(task.metadata, {"c": 3})
+        self.assertEqual(task.to_dict()["metadata"], {"c": 3})
+        self.assertNotEqual(task, stored)
+    
+    def test_30_reject_non_finite_json(self):
+        """Test that NaN/Infinity in metadata or results is rejected up front."""
+        with self.assertRaises(ValueError):
+            self.queue.add_task(title="Bad", metadata={"score": float("nan")})
+        with self.assertRaises(ValueError):
+            self.queue.add_tasks([{"title": "Ok"}, {"title": "Bad", "metadata": {"v": float("inf")}}])
+        self.assertEqual(self.queue.get_stats()["total_tasks"], 0)
+        
+        task_id = self.queue.add_task(title="Good", metadata={"score": 1.5})
+        with self.assertRaises(ValueError):
+            self.queue.complete_task(task_id, result={"v": float("inf")})
+        self.assertEqual(self.queue.get_task(task_id).status, TaskStatus.PENDING.value)
+        self.assertTrue(self.queue.fail_task(task_id, error="Boom"))
+    
+    def test_31_task_dataclass_api(self):
+        """Test that Task keeps its dataclass fields, asdict, replace and repr."""
+        names = [f.name for f in dataclasses.fields(Task)]
+        self.assertEqual(names[-1], "metadata")
+        self.assertNotIn("_metadata_json", names)
+        
+        self.queue.add_task(title="Round trip", metadata={"k": [1, 2]})
+        task = self.queue.get_pending()[0]
+        data = dataclasses.asdict(task)
+        self.assertEqual(data, task.to_dict())
+        self.assertEqual(data["metadata"], {"k": [1, 2]})
+        self.assertEqual(Task(**data), task)
+        
+        done = dataclasses.replace(task, status="completed")
+        self.assertEqual(done.status, "completed")
+        self.assertEqual(done.metadata, {"k": [1, 2]})
+        self.assertIn("metadata={'k': [1, 2]}", repr(done))
+    
+    def test_32_iteration_in_transaction_releases_lock(self):
+        """Test that an iterator started in a transaction doesn't hold the write lock."""
+        with self.queue.transaction():
+            self.queue.add_task(title="First")
+            self.queue.add_task(title="Second")
+            pending = self.queue.iter_pending()
+            self.assertEqual(next(pending).title, "First")
+        
+        # The transaction is over; another thread must be able to write
+        # while the iterator is still paused
+        writer = threading.Thread(target=self.queue.add_task, args=("Third",))
+        writer.start()
+        writer.join(timeout=5)
+        self.assertFalse(writer.is_alive())
+        
+        # Later pages are read fresh, so the new task is included
+        self.assertEqual([t.title for t in pending], ["Second", "Third"])
+        self.assertEqual(len(self.queue.get_pending()), 3)
+    
+    def test_33_pending_queries_use_partial_indexes(self):
+        """Test that every pending-queue query reads a partial index without sorting."""
+        for (by_agent, by_priority, limited), sql in TaskQueuePro._SQL_PENDING.items():
+            plan = " ".join(row[3] for row in self.queue._conn.execute(
+                "EXPLAIN QUERY PLAN " + sql, [None] * sql.count("?")))
+            index = "idx_pending_agent" if by_agent else "idx_pending_order"
+            self.assertIn(f"USING INDEX {index}", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+        
+        for (by_agent, by_priority, after), sql in TaskQueuePro._SQL_PENDING_PAGE.items():
+            plan = " ".join(row[3] for row in self.queue._conn.execute(
+                "EXPLAIN QUERY PLAN " + sql, [None] * sql.count("?")))
+            index = "idx_pending_agent" if by_agent else "idx_pending_order"
+            self.assertIn(f"USING INDEX {index}", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+    
+    def test_34_iteration_pages_by_key(self):
+        """Test that paged iteration matches get_pending() and follows queue changes."""
+        self.queue._FETCH_BATCH = 3
+        for i in range(20):
+            self.queue.add_task(title=f"Task {i}",
+                                assigned_to=("ATLAS", "FORGE", None)[i % 3],
+                                priority=("LOW", "NORMAL", "HIGH", "CRITICAL")[i % 4])
+        
+        for assigned_to in (None, "ATLAS"):
+            for priority_min in (None, "NORMAL"):
+                for limit in (None, 0, 4, 100):
+                    expected = self.queue.get_pending(assigned_to, priority_min, limit)
+                    self.assertEqual(list(self.queue.iter_pending(assigned_to, priority_min, limit)),
+                                     expected)
+        
+        # Tasks claimed between pages are skipped, never repeated
+        pending = self.queue.iter_pending()
+        seen = [next(pending).task_id for _ in range(3)]
+        claimed = self.queue.claim_next("FORGE")
+        seen += [task.task_id for task in pending]
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertNotIn(claimed.task_id, seen[3:])
+    
+    def test_35_metadata_stored_as_text_by_default(self):
+        """Test that metadata stays JSON text unless JSONB is requested."""
+        task_id = self.queue.add_task(title="Text", metadata={"k": 1})
+        self.queue.fail_task(task_id, error="Boom")
+        
+        conn = self.queue._conn
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], 0)
+        self.assertEqual(conn.execute("SELECT typeof(metadata_json) FROM tasks").fetchone()[0], "text")
+        self.assertEqual(self.queue.get_task(task_id).metadata, {"k": 1, "error": "Boom"})
+        
+        # Every JSONB statement differs from its text version
+        for name, jsonb_sql in TaskQueuePro._SQL_JSONB.items():
+            self.assertNotEqual(jsonb_sql, getattr(TaskQueuePro, name), name)
+    
+    @unittest.skipUnless(taskqueuepro._JSONB_SUPPORTED, "JSONB needs SQLite 3.45+")
+    def test_36_jsonb_opt_in_converts_database(self):
+        """Test that jsonb=True converts existing metadata and marks the database."""
+        old_id = self.queue.add_task(title="Old", metadata={"k": 1})
+        self.queue.close()
+        
+        self.queue = TaskQueuePro(self.test_db, jsonb=True)
+        new_id = self.queue.add_task(title="New", metadata={"k": 2})
+        self.queue.fail_task(old_id, error="Boom")
+        self.queue.complete_task(new_id, result={"ok": True})
+        self.queue.close()
+        
+        # The format follows the database, not the caller
+        self.queue = TaskQueuePro(self.test_db)
+        conn = self.queue._conn
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], 1)
+        self.assertEqual({row[0] for row in conn.execute("SELECT typeof(metadata_json) FROM tasks")}, {"blob"})
+        self.assertEqual(self.queue.get_task(old_id).metadata, {"k": 1, "error": "Boom"})
+        self.assertEqual(self.queue.get_task(new_id).metadata, {"k": 2, "result": {"ok": True}})
+    
+    def test_37_jsonb_refused_without_support(self):
+        """Test that builds without JSONB refuse to request or open a JSONB database."""
+        with mock.patch.object(taskqueuepro, "_JSONB_SUPPORTED", False):
+            with self.assertRaises(sqlite3.NotSupportedError):
+                TaskQueuePro(self.test_db, jsonb=True)
+            self.assertEqual(self.queue._conn.execute("PRAGMA user_version").fetchone()[0], 0)
+            
+            self.queue._conn.execute("PRAGMA user_version = 1")
+            with self.assertRaises(sqlite3.NotSupportedError):
+                TaskQueuePro(self.test_db)
 
 def run_tests():
     """Run all tests."""